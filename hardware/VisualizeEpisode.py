@@ -1,59 +1,222 @@
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pa_csv
+import numpy as np
+from numba import njit
 import plotly.express as px
 import dash
 from dash import dcc, html
 from dash.dependencies import Input, Output
 from pathlib import Path
 import socket
+import json
+import re
 from flask import send_from_directory
+from flask_compress import Compress
+from waitress import serve
+from PIL import Image
 
 # Configuration
 DATA_DIR = Path("dataset").resolve()
 PORT = 8050  # Default Dash port
+SERVER_THREADS = 8  # Waitress worker threads
+CACHE_CONTROL = "public, max-age=31536000, immutable"  # For files that never change
+# Frames are never rewritten and sprite sheet URLs are versioned; all other
+# dataset files (data.csv, cache files) keep Flask's default conditional caching
+IMMUTABLE_PATH = re.compile(r"[^/]+/(\w+_frames/[^/]+|\w+_sprite_\d+\.jpg)")
+CACHE_FILE = DATA_DIR / ".episodes_cache.parquet"  # Consolidated episode data
+CACHE_META = DATA_DIR / ".episodes_cache.meta.json"  # Schema version and CSV mtimes
+CACHE_VERSION = 2  # Bump whenever the cached columns or dtypes change
+# Column types are applied by the Arrow reader itself, so timestamps stay raw text
+CSV_COLUMN_TYPES = {
+    "timestamp": pa.string(),
+    "angle1": pa.float32(),
+    "angle2": pa.float32(),
+    "angle3": pa.float32(),
+    "picam_frame": pa.string(),
+    "webcam_frame": pa.string(),
+}
+SPRITE_TILE = (64, 48)  # Thumbnail size in sprite sheets
+SPRITE_COLUMNS = 32  # Thumbnails per sprite sheet row
+SPRITE_ROWS = 32  # Thumbnail rows per sprite sheet (2048x1536 px sheets)
+SPRITE_SHEET_TILES = SPRITE_COLUMNS * SPRITE_ROWS
+IMAGE_STYLE = {
+    "width": "400px",
+    "height": "300px",
+    "border": "2px solid #333",
+    "backgroundRepeat": "no-repeat",
+}
 
 # Initialize Dash app
 app = dash.Dash(__name__)
+Compress(app.server)  # Gzip callback and figure JSON
 
 
-# Load dataset from all episodes
+# Parse a CSV log with Arrow, keeping string columns exactly as written
+def read_csv_log(csv_file):
+    options = pa_csv.ConvertOptions(column_types=CSV_COLUMN_TYPES)
+    table = pa_csv.read_csv(str(csv_file), convert_options=options)
+    return table.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+
+
+# Load a single episode's CSV log
+def load_episode(episode):
+    df = read_csv_log(episode / "data.csv")
+    df["episode"] = episode.name
+    return df
+
+
+# Load dataset from all episodes, reusing the Parquet cache where possible
 def load_episodes():
-    episode_dirs = [d for d in DATA_DIR.glob("*") if d.is_dir()]
+    episode_dirs = sorted(
+        d for d in DATA_DIR.glob("*") if d.is_dir() and (d / "data.csv").exists()
+    )
+    mtimes = {d.name: (d / "data.csv").stat().st_mtime for d in episode_dirs}
+
+    try:
+        meta = json.loads(CACHE_META.read_text())
+        if meta["version"] != CACHE_VERSION:
+            raise ValueError("Cache schema is out of date")
+        cached_mtimes = meta["mtimes"]
+        cached = pd.read_parquet(CACHE_FILE)
+    except Exception:
+        cached_mtimes, cached = {}, None
+
+    if cached is not None and cached_mtimes == mtimes:
+        cached["episode"] = cached["episode"].cat.remove_unused_categories()
+        return cached
+
+    # Split the cached rows by episode once instead of scanning per episode
+    groups = (
+        dict(tuple(cached.groupby("episode", observed=True, sort=False)))
+        if cached is not None
+        else {}
+    )
 
     dfs = []
     for episode in episode_dirs:
-        csv_file = episode / "data.csv"
-        if csv_file.exists():
-            df = pd.read_csv(csv_file)
-            df["episode"] = episode.name
-            df["picam_path"] = df["picam_frame"].apply(
-                lambda x: f"/dataset/{episode.name}/picam_frames/{x}"
-            )
-            df["webcam_path"] = df["webcam_frame"].apply(
-                lambda x: f"/dataset/{episode.name}/webcam_frames/{x}"
-            )
-            dfs.append(df)
+        unchanged = cached_mtimes.get(episode.name) == mtimes[episode.name]
+        if unchanged and episode.name in groups:
+            dfs.append(groups[episode.name])
+        else:
+            dfs.append(load_episode(episode))
+
+    if not dfs:
+        return pd.DataFrame()
+
+    df = pd.concat(dfs, ignore_index=True)
+    # Slices of the cached Categorical keep every cached episode as a category
+    df["episode"] = df["episode"].astype("category").cat.remove_unused_categories()
+    try:
+        df.to_parquet(CACHE_FILE, compression="snappy", index=False)
+        CACHE_META.write_text(json.dumps({"version": CACHE_VERSION, "mtimes": mtimes}))
+    except Exception as e:
+        print(f"Cache write failed: {str(e)}")
+    return df
 
-    return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+
+# Mark rows whose episode code is one of the targets
+@njit(cache=True)
+def build_mask(codes, targets):
+    out = np.zeros(codes.size, dtype=np.bool_)
+    for i in range(codes.size):
+        for t in targets:
+            if codes[i] == t:
+                out[i] = True
+                break
+    return out
+
+
+# Build the joint angle figure for a set of rows
+def make_figure(data):
+    return px.line(
+        data,
+        x="timestamp",
+        y=["angle1", "angle2", "angle3"],
+        labels={"value": "Angle (degrees)", "timestamp": "Time"},
+        title="Robotic Arm Joint Angles",
+        hover_data=["episode", "picam_frame", "webcam_frame"],
+        color="episode",
+    )
 
 
 df = load_episodes()
 
+# Position of each row within its episode, which locates its sprite tile
+df["tile"] = df.groupby("episode", sort=False, observed=True).cumcount()
+
+# Categorical episode codes, so filtering never rescans the episode strings
+EPISODE_NAMES = df["episode"].cat.categories
+EPISODE_CODES = df["episode"].cat.codes.to_numpy(dtype=np.int32)
+
+# Compile the filter kernel now rather than on the first dropdown change
+build_mask(EPISODE_CODES[:1], np.zeros(1, dtype=np.int32))
+
+
+# Sprite sheet versions per episode, appended to their URLs to bust the cache
+SPRITE_VERSIONS = {}
+
+
+# Collate frames into one fixed-size thumbnail sheet
+def build_sheet(frame_dir, frame_names):
+    sheet = Image.new(
+        "RGB", (SPRITE_COLUMNS * SPRITE_TILE[0], SPRITE_ROWS * SPRITE_TILE[1])
+    )
+    for tile, frame in enumerate(frame_names):
+        try:
+            with Image.open(frame_dir / frame) as img:
+                img.draft("RGB", SPRITE_TILE)  # Downscale during JPEG decode
+                thumb = img.convert("RGB").resize(SPRITE_TILE)
+        except OSError as e:
+            print(f"Sprite frame error: {str(e)}")
+            continue
+        sheet.paste(
+            thumb,
+            (
+                (tile % SPRITE_COLUMNS) * SPRITE_TILE[0],
+                (tile // SPRITE_COLUMNS) * SPRITE_TILE[1],
+            ),
+        )
+    return sheet
+
+
+# Split each episode's frames into thumbnail sprite sheets per camera
+def build_sprites():
+    for episode, frames in df.groupby("episode", sort=False, observed=True):
+        episode_dir = DATA_DIR / episode
+        csv_mtime = (episode_dir / "data.csv").stat().st_mtime
+        SPRITE_VERSIONS[episode] = int(csv_mtime)
+
+        for camera in ("picam", "webcam"):
+            frame_names = frames[f"{camera}_frame"].tolist()
+            for sheet in range(-(-len(frame_names) // SPRITE_SHEET_TILES)):
+                sprite_file = episode_dir / f"{camera}_sprite_{sheet}.jpg"
+                if sprite_file.exists() and sprite_file.stat().st_mtime >= csv_mtime:
+                    continue
+
+                start = sheet * SPRITE_SHEET_TILES
+                try:
+                    build_sheet(
+                        episode_dir / f"{camera}_frames",
+                        frame_names[start : start + SPRITE_SHEET_TILES],
+                    ).save(sprite_file, quality=85)
+                except OSError as e:
+                    print(f"Sprite sheet error: {str(e)}")
+
+
+build_sprites()
+
 # Create figure
-fig = px.line(
-    df,
-    x="timestamp",
-    y=["angle1", "angle2", "angle3"],
-    labels={"value": "Angle (degrees)", "timestamp": "Time"},
-    title="Robotic Arm Joint Angles",
-    hover_data=["episode", "picam_frame", "webcam_frame"],
-    color="episode",
-)
+fig = make_figure(df)
 
 
 # Serve dataset files
 @app.server.route("/dataset/<path:subpath>")
 def serve_dataset(subpath):
-    return send_from_directory(DATA_DIR, subpath)
+    response = send_from_directory(DATA_DIR, subpath, conditional=True)
+    if IMMUTABLE_PATH.fullmatch(subpath):
+        response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
 
 
 # App layout
@@ -64,9 +227,7 @@ app.layout = html.Div(
                 html.H1("Robotic Arm Visualization - Multi-Episode Analysis"),
                 dcc.Dropdown(
                     id="episode-selector",
-                    options=[
-                        {"label": ep, "value": ep} for ep in df["episode"].unique()
-                    ],
+                    options=[{"label": ep, "value": ep} for ep in EPISODE_NAMES],
                     multi=True,
                     placeholder="Select episodes to display",
                 ),
@@ -82,13 +243,7 @@ app.layout = html.Div(
                                 html.Div(
                                     [
                                         html.H3("PiCam View"),
-                                        html.Img(
-                                            id="picam-image",
-                                            style={
-                                                "width": "400px",
-                                                "border": "2px solid #333",
-                                            },
-                                        ),
+                                        html.Div(id="picam-image", style=IMAGE_STYLE),
                                         html.Div(id="picam-info"),
                                     ],
                                     style={"margin-bottom": "20px"},
@@ -96,13 +251,7 @@ app.layout = html.Div(
                                 html.Div(
                                     [
                                         html.H3("Webcam View"),
-                                        html.Img(
-                                            id="webcam-image",
-                                            style={
-                                                "width": "400px",
-                                                "border": "2px solid #333",
-                                            },
-                                        ),
+                                        html.Div(id="webcam-image", style=IMAGE_STYLE),
                                         html.Div(id="webcam-info"),
                                     ]
                                 ),
@@ -118,38 +267,75 @@ app.layout = html.Div(
 )
 
 
-# Update image callback
+# Style showing a full image
+def image_style(url):
+    return {
+        **IMAGE_STYLE,
+        "backgroundImage": f"url({url})",
+        "backgroundSize": "100% 100%",
+    }
+
+
+# Style showing one episode frame's tile from its camera's sprite sheet
+def sprite_style(episode, camera, tile):
+    sheet, tile = divmod(tile, SPRITE_SHEET_TILES)
+    row, col = divmod(tile, SPRITE_COLUMNS)
+    url = f"/dataset/{episode}/{camera}_sprite_{sheet}.jpg?v={SPRITE_VERSIONS[episode]}"
+    return {
+        **IMAGE_STYLE,
+        "backgroundImage": f"url({url})",
+        "backgroundSize": f"{SPRITE_COLUMNS * 100}% {SPRITE_ROWS * 100}%",
+        "backgroundPosition": (
+            f"{col / (SPRITE_COLUMNS - 1) * 100}% {row / (SPRITE_ROWS - 1) * 100}%"
+        ),
+    }
+
+
+# Update image callback: hover shows sprite thumbnails, click loads full frames
 @app.callback(
     [
-        Output("picam-image", "src"),
-        Output("webcam-image", "src"),
+        Output("picam-image", "style"),
+        Output("webcam-image", "style"),
         Output("picam-info", "children"),
         Output("webcam-info", "children"),
     ],
-    [Input("angle-plot", "hoverData")],
+    [Input("angle-plot", "hoverData"), Input("angle-plot", "clickData")],
 )
-def update_images(hoverData):
-    if hoverData is None:
+def update_images(hoverData, clickData):
+    triggered = dash.callback_context.triggered[0]["prop_id"]
+    full_res = triggered == "angle-plot.clickData"
+    point_data = clickData if full_res else hoverData
+
+    if point_data is None:
         return [
-            "/assets/placeholder.jpg",
-            "/assets/placeholder.jpg",
+            image_style("/assets/placeholder.jpg"),
+            image_style("/assets/placeholder.jpg"),
             "Hover over the plot to see PiCam images",
             "Hover over the plot to see Webcam images",
         ]
 
-    point_index = hoverData["points"][0]["pointIndex"]
+    point_index = point_data["points"][0]["pointIndex"]
     try:
         row = df.iloc[point_index]
+        episode = row["episode"]
+        if full_res:
+            picam = image_style(f"/dataset/{episode}/picam_frames/{row['picam_frame']}")
+            webcam = image_style(
+                f"/dataset/{episode}/webcam_frames/{row['webcam_frame']}"
+            )
+        else:
+            picam = sprite_style(episode, "picam", row["tile"])
+            webcam = sprite_style(episode, "webcam", row["tile"])
         return [
-            row["picam_path"],
-            row["webcam_path"],
+            picam,
+            webcam,
             f"Episode: {row['episode']}<br>Time: {row['timestamp']}",
             f"Episode: {row['episode']}<br>Time: {row['timestamp']}",
         ]
     except IndexError:
         return [
-            "/assets/placeholder.jpg",
-            "/assets/placeholder.jpg",
+            image_style("/assets/placeholder.jpg"),
+            image_style("/assets/placeholder.jpg"),
             "Invalid data point",
             "Invalid data point",
         ]
@@ -158,20 +344,12 @@ def update_images(hoverData):
 # Episode selector callback
 @app.callback(Output("angle-plot", "figure"), [Input("episode-selector", "value")])
 def update_plot(selected_episodes):
-    if selected_episodes:
-        filtered_df = df[df["episode"].isin(selected_episodes)]
-    else:
-        filtered_df = df
+    if not selected_episodes:
+        return fig
 
-    return px.line(
-        filtered_df,
-        x="timestamp",
-        y=["angle1", "angle2", "angle3"],
-        labels={"value": "Angle (degrees)", "timestamp": "Time"},
-        title="Robotic Arm Joint Angles",
-        hover_data=["episode", "picam_frame", "webcam_frame"],
-        color="episode",
-    )
+    targets = EPISODE_NAMES.get_indexer(selected_episodes).astype(np.int32)
+    mask = build_mask(EPISODE_CODES, targets)
+    return make_figure(df[mask])
 
 
 # Get network IP
@@ -192,4 +370,4 @@ if __name__ == "__main__":
     print(f"Local: http://localhost:{PORT}")
     print(f"Network: http://{get_ip()}:{PORT}")
     print(f"{'=' * 40}\n")
-    app.run(host="0.0.0.0", port=PORT)
+    serve(app.server, host="0.0.0.0", port=PORT, threads=SERVER_THREADS)
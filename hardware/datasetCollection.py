@@ -7,7 +7,8 @@ import time
 import os
 import numpy as np
 from datetime import datetime
-from threading import Lock
+from threading import Thread
+import queue
 
 # ================= Configuration =================
 DATA_DIR = "dataset"
@@ -17,13 +18,15 @@ SERVO_PINS = [18, 19]  # GPIO pins for 2 servos
 FILTER_SIZE = 10  # Moving average filter size
 MAX_CAMERA_RETRIES = 3  # Camera recovery attempts
 TARGET_FPS = 30  # Frame capture rate
+JPEG_QUALITY = 85  # Saved frame quality (0-100)
+WRITE_QUEUE_SIZE = 4  # Frame sets pending encode before dropping
+CSV_FLUSH_ROWS = 30  # Rows buffered before writing to the CSV log
 # ==================================================
 
 
 class DataCollector:
     def __init__(self):
         self.running = False
-        self.lock = Lock()
         self._create_directories()
 
         # Initialize hardware components
@@ -33,9 +36,20 @@ class DataCollector:
         self.csv_file, self.csv_writer = self._init_csv()
 
         # Data buffers
-        self.adc_history = {ch: [] for ch in SPI_CHANNELS}
+        self.csv_rows = []
+        self.adc_history = {
+            ch: np.zeros(FILTER_SIZE, dtype=np.int32) for ch in SPI_CHANNELS
+        }
+        self.adc_sums = {ch: 0 for ch in SPI_CHANNELS}
+        self.adc_idx = {ch: 0 for ch in SPI_CHANNELS}
+        self.adc_count = {ch: 0 for ch in SPI_CHANNELS}
         self.last_frame_time = time.time()
 
+        # Background JPEG encoder
+        self.write_q = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self.writer = Thread(target=self._write_frames, daemon=True)
+        self.writer.start()
+
     def _create_directories(self):
         """Create required dataset directories"""
         os.makedirs(os.path.join(DATA_DIR, "videos"), exist_ok=True)
@@ -46,8 +60,11 @@ class DataCollector:
         for attempt in range(MAX_CAMERA_RETRIES):
             try:
                 camera = Picamera2()
-                config = camera.create_still_configuration(
-                    main={"size": VIDEO_RESOLUTION}, buffer_count=2, display="main"
+                # Picamera2's RGB888 is laid out [B, G, R], as OpenCV expects
+                config = camera.create_video_configuration(
+                    main={"size": VIDEO_RESOLUTION, "format": "RGB888"},
+                    buffer_count=2,
+                    display="main",
                 )
                 camera.configure(config)
                 camera.start()
@@ -79,7 +96,7 @@ class DataCollector:
         """Initialize CSV data logger"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         csv_path = os.path.join(DATA_DIR, f"data_{timestamp}.csv")
-        file = open(csv_path, "w", newline="")
+        file = open(csv_path, "w", newline="", buffering=65536)
         writer = csv.writer(file)
         writer.writerow(["timestamp", "angle1", "angle2", "video_frame"])
         return file, writer
@@ -94,13 +111,15 @@ class DataCollector:
             return None
 
     def _moving_average(self, new_value, channel):
-        """Apply moving average filter to ADC values"""
-        with self.lock:
-            history = self.adc_history[channel]
-            history.append(new_value)
-            if len(history) > FILTER_SIZE:
-                history.pop(0)
-            return sum(history) / len(history)
+        """Apply moving average filter to ADC values using a ring buffer"""
+        # Only the main loop updates the filter, so no lock is needed
+        history = self.adc_history[channel]
+        idx = self.adc_idx[channel]
+        self.adc_sums[channel] += new_value - int(history[idx])
+        history[idx] = new_value
+        self.adc_idx[channel] = (idx + 1) % FILTER_SIZE
+        self.adc_count[channel] = min(self.adc_count[channel] + 1, FILTER_SIZE)
+        return self.adc_sums[channel] / self.adc_count[channel]
 
     def _get_angles(self):
         """Read and process angles from both potentiometers"""
@@ -121,9 +140,9 @@ class DataCollector:
         """Capture and save video frame with error recovery"""
         try:
             frame = self.camera.capture_array()
-            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
             filename = os.path.join(DATA_DIR, "videos", f"{timestamp}.jpg")
-            cv2.imwrite(filename, frame)
+            if not self._queue_frames([(filename, frame)]):
+                return None
             return filename
         except Exception as e:
             print(f"Frame capture error: {str(e)}")
@@ -133,35 +152,74 @@ class DataCollector:
             time.sleep(1)
             return None
 
+    def _write_frames(self):
+        """Encode and save queued frame sets until a None sentinel arrives"""
+        while True:
+            frames = self.write_q.get()
+            if frames is None:
+                return
+            for filename, frame in frames:
+                try:
+                    cv2.imwrite(
+                        filename, frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
+                    )
+                except Exception as e:
+                    print(f"Frame write error: {str(e)}")
+
+    def _queue_frames(self, frames):
+        """Hand frames to the encoder thread as one item; drop all if it is full"""
+        try:
+            self.write_q.put_nowait(frames)
+            return True
+        except queue.Full:
+            return False
+
+    def _flush_rows(self):
+        """Write buffered CSV rows to disk, formatting timestamps as ISO 8601"""
+        self.csv_writer.writerows(
+            [datetime.fromtimestamp(row[0] / 1e9).isoformat(), *row[1:]]
+            for row in self.csv_rows
+        )
+        self.csv_rows.clear()
+        self.csv_file.flush()
+
     def run(self):
         """Main data collection loop"""
         self.running = True
         print("Starting data collection... (Press Ctrl+C to stop)")
 
         try:
+            period = 1 / TARGET_FPS
+            next_deadline = time.monotonic() + period
             while self.running:
-                start_time = time.time()
-                timestamp = datetime.now().isoformat()
+                timestamp = time.time_ns()  # Formatted only when rows are flushed
 
                 # Capture sensor data
                 angles = self._get_angles()
                 frame_path = self._capture_frame(timestamp)
 
                 if angles and frame_path:
-                    # Write to CSV
-                    self.csv_writer.writerow(
+                    # Buffer CSV row
+                    self.csv_rows.append(
                         [timestamp, angles[0], angles[1], os.path.basename(frame_path)]
                     )
 
-                    # Update servo positions
+                    if len(self.csv_rows) >= CSV_FLUSH_ROWS:
+                        self._flush_rows()
+
+                # Update servo positions, whether or not the sample was recorded
+                if angles:
                     for pin, angle in zip(SERVO_PINS, angles):
                         pulse_width = int(500 + (angle / 180) * 2000)
                         self.pi.set_servo_pulsewidth(pin, pulse_width)
 
-                # Maintain frame rate
-                elapsed = time.time() - start_time
-                sleep_time = max(0, (1 / TARGET_FPS) - elapsed)
-                time.sleep(sleep_time)
+                # Maintain frame rate on a fixed monotonic schedule
+                now = time.monotonic()
+                if now < next_deadline:
+                    time.sleep(next_deadline - now)
+                next_deadline += period
+                if now > next_deadline:
+                    next_deadline = now + period  # Resync after an overrun
 
         except KeyboardInterrupt:
             self.running = False
@@ -172,6 +230,10 @@ class DataCollector:
         """Release all resources safely"""
         print("\nCleaning up resources...")
 
+        if hasattr(self, "writer") and self.writer.is_alive():
+            self.write_q.put(None)
+            self.writer.join()
+
         if hasattr(self, "camera") and self.camera.started:
             self.camera.stop()
             self.camera.close()
@@ -180,6 +242,7 @@ class DataCollector:
             self.spi.close()
 
         if hasattr(self, "csv_file"):
+            self._flush_rows()
             self.csv_file.close()
 
         if hasattr(self, "pi"):
@@ -7,7 +7,9 @@ import time
 import os
 import numpy as np
 from datetime import datetime
-from threading import Lock
+from threading import Thread
+import queue
+from concurrent.futures import ThreadPoolExecutor
 
 # ================= Configuration =================
 DATA_DIR = "dataset"
@@ -19,13 +21,15 @@ WEBCAM_INDEX = 1  # USB webcam device index
 FILTER_SIZE = 10  # Moving average filter size
 MAX_CAMERA_RETRIES = 3  # Camera recovery attempts
 TARGET_FPS = 30  # Frame capture rate
+JPEG_QUALITY = 85  # Saved frame quality (0-100)
+WRITE_QUEUE_SIZE = 4  # Frame sets pending encode before dropping
+CSV_FLUSH_ROWS = 30  # Rows buffered before writing to the CSV log
 # ==================================================
 
 
 class DataCollector:
     def __init__(self):
         self.running = False
-        self.lock = Lock()
         self.episode_dir = self._create_episode_dir()
 
         # Initialize hardware components
@@ -36,9 +40,24 @@ class DataCollector:
         self.csv_file, self.csv_writer = self._init_csv()
 
         # Data buffers
-        self.adc_history = {ch: [] for ch in SPI_CHANNELS}
+        self.csv_rows = []
+        self.adc_history = {
+            ch: np.zeros(FILTER_SIZE, dtype=np.int32) for ch in SPI_CHANNELS
+        }
+        self.adc_sums = {ch: 0 for ch in SPI_CHANNELS}
+        self.adc_idx = {ch: 0 for ch in SPI_CHANNELS}
+        self.adc_count = {ch: 0 for ch in SPI_CHANNELS}
+        self.adc_commands = [[6 | (ch >> 2), (ch & 3) << 6, 0] for ch in SPI_CHANNELS]
         self.last_frame_time = time.time()
 
+        # Parallel camera reads
+        self.pool = ThreadPoolExecutor(max_workers=2)
+
+        # Background JPEG encoder
+        self.write_q = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self.writer = Thread(target=self._write_frames, daemon=True)
+        self.writer.start()
+
     def _create_episode_dir(self):
         """Create episode directory with timestamp"""
         timestamp = datetime.now().strftime(EPISODE_FORMAT)
@@ -54,8 +73,11 @@ class DataCollector:
         for attempt in range(MAX_CAMERA_RETRIES):
             try:
                 camera = Picamera2()
+                # Picamera2's RGB888 is laid out [B, G, R], as OpenCV expects
                 config = camera.create_video_configuration(
-                    main={"size": VIDEO_RESOLUTION}, buffer_count=2, display="main"
+                    main={"size": VIDEO_RESOLUTION, "format": "RGB888"},
+                    buffer_count=2,
+                    display="main",
                 )
                 camera.configure(config)
                 camera.start()
@@ -101,39 +123,46 @@ class DataCollector:
     def _init_csv(self):
         """Initialize CSV data logger"""
         csv_path = os.path.join(self.episode_dir, "data.csv")
-        file = open(csv_path, "w", newline="")
+        file = open(csv_path, "w", newline="", buffering=65536)
         writer = csv.writer(file)
         writer.writerow(
             ["timestamp", "angle1", "angle2", "angle3", "picam_frame", "webcam_frame"]
         )
         return file, writer
 
-    def _read_adc(self, channel):
-        """Read ADC value from specified channel"""
+    def _read_adcs(self):
+        """Read ADC values from all configured channels"""
+        # MCP3208 needs CS released between conversions, so each channel
+        # stays its own transfer; the command words are prebuilt once
         try:
-            adc = self.spi.xfer2([6 | (channel >> 2), (channel & 3) << 6, 0])
-            return ((adc[1] & 0x0F) << 8) + adc[2]
+            raws = []
+            for command in self.adc_commands:
+                adc = self.spi.xfer2(command)
+                raws.append(((adc[1] & 0x0F) << 8) + adc[2])
+            return raws
         except Exception as e:
             print(f"ADC read error: {str(e)}")
             return None
 
     def _moving_average(self, new_value, channel):
-        """Apply moving average filter to ADC values"""
-        with self.lock:
-            history = self.adc_history[channel]
-            history.append(new_value)
-            if len(history) > FILTER_SIZE:
-                history.pop(0)
-            return sum(history) / len(history)
+        """Apply moving average filter to ADC values using a ring buffer"""
+        # Only the main loop updates the filter, so no lock is needed
+        history = self.adc_history[channel]
+        idx = self.adc_idx[channel]
+        self.adc_sums[channel] += new_value - int(history[idx])
+        history[idx] = new_value
+        self.adc_idx[channel] = (idx + 1) % FILTER_SIZE
+        self.adc_count[channel] = min(self.adc_count[channel] + 1, FILTER_SIZE)
+        return self.adc_sums[channel] / self.adc_count[channel]
 
     def _get_angles(self):
         """Read and process angles from all potentiometers"""
-        angles = []
-        for ch in SPI_CHANNELS:
-            raw = self._read_adc(ch)
-            if raw is None:
-                return None
+        raws = self._read_adcs()
+        if raws is None:
+            return None
 
+        angles = []
+        for ch, raw in zip(SPI_CHANNELS, raws):
             # Invert and filter ADC value
             inverted = 4095 - raw
             filtered = self._moving_average(inverted, ch)
@@ -150,16 +179,13 @@ class DataCollector:
             "webcam_frame": None,
         }
 
+        # Read both cameras concurrently; each releases the GIL while waiting
+        picam_future = self.pool.submit(self.picam.capture_array)
+        webcam_future = self.pool.submit(self.webcam.read)
+
         try:
             # Capture PiCam frame
-            picam_frame = self.picam.capture_array()
-            picam_frame = cv2.cvtColor(picam_frame, cv2.COLOR_RGB2BGR)
-            picam_filename = os.path.join(
-                self.episode_dir, "picam_frames", f"{timestamp}.jpg"
-            )
-            cv2.imwrite(picam_filename, picam_frame)
-            frame_data["picam"] = picam_filename
-            frame_data["picam_frame"] = picam_frame
+            frame_data["picam_frame"] = picam_future.result()
         except Exception as e:
             print(f"PiCam capture error: {str(e)}")
             self.picam.stop()
@@ -168,21 +194,67 @@ class DataCollector:
 
         try:
             # Capture Webcam frame
-            ret, webcam_frame = self.webcam.read()
+            ret, webcam_frame = webcam_future.result()
             if ret:
-                webcam_filename = os.path.join(
-                    self.episode_dir, "webcam_frames", f"{timestamp}.jpg"
-                )
-                cv2.imwrite(webcam_filename, webcam_frame)
-                frame_data["webcam"] = webcam_filename
                 frame_data["webcam_frame"] = webcam_frame
         except Exception as e:
             print(f"Webcam capture error: {str(e)}")
             self.webcam.release()
             self.webcam = self._init_webcam()
 
+        # Queue both frames as one pair so neither is saved without the other
+        if (
+            frame_data["picam_frame"] is not None
+            and frame_data["webcam_frame"] is not None
+        ):
+            picam_filename = os.path.join(
+                self.episode_dir, "picam_frames", f"{timestamp}.jpg"
+            )
+            webcam_filename = os.path.join(
+                self.episode_dir, "webcam_frames", f"{timestamp}.jpg"
+            )
+            if self._queue_frames(
+                [
+                    (picam_filename, frame_data["picam_frame"]),
+                    (webcam_filename, frame_data["webcam_frame"]),
+                ]
+            ):
+                frame_data["picam"] = picam_filename
+                frame_data["webcam"] = webcam_filename
+
         return frame_data
 
+    def _write_frames(self):
+        """Encode and save queued frame sets until a None sentinel arrives"""
+        while True:
+            frames = self.write_q.get()
+            if frames is None:
+                return
+            for filename, frame in frames:
+                try:
+                    cv2.imwrite(
+                        filename, frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
+                    )
+                except Exception as e:
+                    print(f"Frame write error: {str(e)}")
+
+    def _queue_frames(self, frames):
+        """Hand frames to the encoder thread as one item; drop all if it is full"""
+        try:
+            self.write_q.put_nowait(frames)
+            return True
+        except queue.Full:
+            return False
+
+    def _flush_rows(self):
+        """Write buffered CSV rows to disk, formatting timestamps as ISO 8601"""
+        self.csv_writer.writerows(
+            [datetime.fromtimestamp(row[0] / 1e9).isoformat(), *row[1:]]
+            for row in self.csv_rows
+        )
+        self.csv_rows.clear()
+        self.csv_file.flush()
+
     def run(self):
         """Main data collection loop"""
         self.running = True
@@ -191,9 +263,10 @@ class DataCollector:
         cv2.namedWindow("WebCam View", cv2.WINDOW_NORMAL)
 
         try:
+            period = 1 / TARGET_FPS
+            next_deadline = time.monotonic() + period
             while self.running:
-                start_time = time.time()
-                timestamp = datetime.now().isoformat()
+                timestamp = time.time_ns()  # Formatted only when rows are flushed
 
                 # Capture sensor data
                 angles = self._get_angles()
@@ -201,8 +274,8 @@ class DataCollector:
 
                 # Process and record data if all components available
                 if angles and frame_data["picam"] and frame_data["webcam"]:
-                    # Write to CSV
-                    self.csv_writer.writerow(
+                    # Buffer CSV row
+                    self.csv_rows.append(
                         [
                             timestamp,
                             angles[0],
@@ -213,7 +286,11 @@ class DataCollector:
                         ]
                     )
 
-                    # Update servo positions
+                    if len(self.csv_rows) >= CSV_FLUSH_ROWS:
+                        self._flush_rows()
+
+                # Update servo positions, whether or not the sample was recorded
+                if angles:
                     for pin, angle in zip(SERVO_PINS, angles):
                         pulse_width = int(500 + (angle / 180) * 2000)
                         self.pi.set_servo_pulsewidth(pin, pulse_width)
@@ -229,10 +306,13 @@ class DataCollector:
                 if key == ord("q"):
                     self.running = False
 
-                # Maintain frame rate
-                elapsed = time.time() - start_time
-                sleep_time = max(0, (1 / TARGET_FPS) - elapsed)
-                time.sleep(sleep_time)
+                # Maintain frame rate on a fixed monotonic schedule
+                now = time.monotonic()
+                if now < next_deadline:
+                    time.sleep(next_deadline - now)
+                next_deadline += period
+                if now > next_deadline:
+                    next_deadline = now + period  # Resync after an overrun
 
         except KeyboardInterrupt:
             self.running = False
@@ -242,8 +322,15 @@ class DataCollector:
     def _cleanup(self):
         """Release all resources safely"""
         print("\nCleaning up resources...")
+
+        if hasattr(self, "writer") and self.writer.is_alive():
+            self.write_q.put(None)
+            self.writer.join()
         cv2.destroyAllWindows()
 
+        if hasattr(self, "pool"):
+            self.pool.shutdown(wait=True)
+
         if hasattr(self, "picam") and self.picam.started:
             self.picam.stop()
             self.picam.close()
@@ -255,6 +342,7 @@ class DataCollector:
             self.spi.close()
 
         if hasattr(self, "csv_file"):
+            self._flush_rows()
             self.csv_file.close()
 
         if hasattr(self, "pi"):
@@ -1,23 +1,67 @@
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pa_csv
 import plotly.express as px
 import dash
 from dash import dcc, html
 from dash.dependencies import Input, Output
 from pathlib import Path
 import socket
+import json
 from flask import send_from_directory
+from flask_compress import Compress
+from waitress import serve
 
 # Configuration
 DATA_DIR = Path("dataset").resolve()
 PORT = 8050  # Default Dash port
+SERVER_THREADS = 8  # Waitress worker threads
+CACHE_CONTROL = "public, max-age=31536000, immutable"  # Frame files never change
+CACHE_FILE = DATA_DIR / ".pi_cache.parquet"  # Consolidated CSV data
+CACHE_META = DATA_DIR / ".pi_cache.meta.json"  # Schema version and CSV mtimes
+CACHE_VERSION = 2  # Bump whenever the cached columns or dtypes change
+# Column types are applied by the Arrow reader itself, so timestamps stay raw text
+CSV_COLUMN_TYPES = {
+    "timestamp": pa.string(),
+    "angle1": pa.float32(),
+    "angle2": pa.float32(),
+    "video_frame": pa.string(),
+}
 
 # Initialize Dash app
 app = dash.Dash(__name__)
+Compress(app.server)  # Gzip callback and figure JSON
 
-# Load dataset
-csv_files = list(DATA_DIR.glob("*.csv"))
-df = pd.concat([pd.read_csv(f) for f in csv_files])
-df["image_path"] = df["video_frame"].apply(lambda x: f"/dataset/videos/{x}")
+
+# Parse a CSV log with Arrow, keeping string columns exactly as written
+def read_csv_log(csv_file):
+    options = pa_csv.ConvertOptions(column_types=CSV_COLUMN_TYPES)
+    table = pa_csv.read_csv(str(csv_file), convert_options=options)
+    return table.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+
+
+# Load dataset, reusing the Parquet cache when no CSV log has changed
+def load_dataset():
+    csv_files = sorted(DATA_DIR.glob("*.csv"))
+    mtimes = {f.name: f.stat().st_mtime for f in csv_files}
+
+    try:
+        meta = json.loads(CACHE_META.read_text())
+        if meta == {"version": CACHE_VERSION, "mtimes": mtimes}:
+            return pd.read_parquet(CACHE_FILE)
+    except Exception:
+        pass
+
+    df = pd.concat([read_csv_log(f) for f in csv_files])
+    try:
+        df.to_parquet(CACHE_FILE, compression="snappy")
+        CACHE_META.write_text(json.dumps({"version": CACHE_VERSION, "mtimes": mtimes}))
+    except Exception as e:
+        print(f"Cache write failed: {str(e)}")
+    return df
+
+
+df = load_dataset()
 
 # Create figure
 fig = px.line(
@@ -32,7 +76,9 @@ fig = px.line(
 # Serve images from dataset/videos
 @app.server.route("/dataset/videos/<path:filename>")
 def serve_image(filename):
-    return send_from_directory(DATA_DIR / "videos", filename)
+    response = send_from_directory(DATA_DIR / "videos", filename, conditional=True)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
 
 
 # App layout
@@ -80,10 +126,9 @@ def update_image(hoverData):
         return "/assets/placeholder.jpg", "Hover over the plot to see images"
 
     point_index = hoverData["points"][0]["pointIndex"]
-    img_path = df.iloc[point_index]["image_path"]
-    timestamp = df.iloc[point_index]["timestamp"]
+    row = df.iloc[point_index]
 
-    return img_path, f"Time: {timestamp}"
+    return f"/dataset/videos/{row['video_frame']}", f"Time: {row['timestamp']}"
 
 
 # Get network IP
@@ -104,4 +149,4 @@ if __name__ == "__main__":
     print(f"Local: http://localhost:{PORT}")
     print(f"Network: http://{get_ip()}:{PORT}")
     print(f"{'=' * 40}\n")
-    app.run(host="0.0.0.0", port=PORT)  # Fixed line
+    serve(app.server, host="0.0.0.0", port=PORT, threads=SERVER_THREADS)
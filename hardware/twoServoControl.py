@@ -1,6 +1,7 @@
 import spidev
 import pigpio
 import time
+import numpy as np
 
 # Initialize SPI for MCP3208
 spi = spidev.SpiDev()
@@ -17,42 +18,47 @@ if not pi.connected:
 SERVO_PIN_1 = 18  # GPIO18 for Servo 1
 SERVO_PIN_2 = 19  # GPIO19 for Servo 2
 
-# Filter parameters for both channels
+# Potentiometer 1 on CH0, Potentiometer 2 on CH1
+ADC_CHANNELS = [0, 1]
+adc_commands = [[6 | (ch >> 2), (ch & 3) << 6, 0] for ch in ADC_CHANNELS]
+
+# Filter parameters for both channels (one ring buffer row per channel)
 FILTER_SIZE = 10
-adc_history_1 = []
-adc_history_2 = []
+adc_history = np.zeros((len(ADC_CHANNELS), FILTER_SIZE), dtype=np.int32)
+adc_sums = np.zeros(len(ADC_CHANNELS))
+adc_idx = 0
+adc_count = 0
 
 
-def read_adc(channel):
-    adc = spi.xfer2([6 | (channel >> 2), (channel & 3) << 6, 0])
-    return ((adc[1] & 0x0F) << 8) + adc[2]
+def read_adcs():
+    # MCP3208 needs CS released between conversions: one transfer per channel
+    raws = np.empty(len(ADC_CHANNELS), dtype=np.int32)
+    for i, command in enumerate(adc_commands):
+        adc = spi.xfer2(command)
+        raws[i] = ((adc[1] & 0x0F) << 8) + adc[2]
+    return raws
 
 
-def moving_average(new_value, history):
-    history.append(new_value)
-    if len(history) > FILTER_SIZE:
-        history.pop(0)
-    return sum(history) / len(history)
+def moving_average(new_values):
+    global adc_idx, adc_count
+    adc_sums[:] += new_values - adc_history[:, adc_idx]
+    adc_history[:, adc_idx] = new_values
+    adc_idx = (adc_idx + 1) % FILTER_SIZE
+    adc_count = min(adc_count + 1, FILTER_SIZE)
+    return adc_sums / adc_count
 
 
 try:
     while True:
-        # Read and filter ADC values
-        raw_adc1 = read_adc(0)  # Potentiometer 1 on CH0
-        filtered_adc1 = moving_average(raw_adc1, adc_history_1)
-        inverted_adc1 = 4095 - filtered_adc1  # Reverse direction
-
-        raw_adc2 = read_adc(1)  # Potentiometer 2 on CH1
-        filtered_adc2 = moving_average(raw_adc2, adc_history_2)
-        inverted_adc2 = 4095 - filtered_adc2  # Reverse direction
+        # Read and filter ADC values for both channels at once
+        filtered = moving_average(read_adcs())
+        inverted = (4095 - filtered) / 4095  # Reverse direction, scaled to 0-1
 
         # Calculate angles (0-180Â°)
-        angle1 = round((inverted_adc1 / 4095) * 180.0, 1)
-        angle2 = round((inverted_adc2 / 4095) * 180.0, 1)
+        angle1, angle2 = np.round(inverted * 180.0, 1)
 
         # Calculate pulse widths (500-2500 Âµs)
-        pulse_width1 = int(500 + (inverted_adc1 / 4095) * 2000)
-        pulse_width2 = int(500 + (inverted_adc2 / 4095) * 2000)
+        pulse_width1, pulse_width2 = (500 + inverted * 2000).astype(np.int32).tolist()
 
         # Update servos
         pi.set_servo_pulsewidth(SERVO_PIN_1, pulse_width1)